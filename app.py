@@ -3,7 +3,10 @@ import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 import yfinance as yf
+import hashlib
+import time
 from datetime import datetime, timedelta
+from pathlib import Path
 
 # --- Page Configuration ---
 st.set_page_config(
@@ -13,59 +16,101 @@ st.set_page_config(
 )
 
 # --- Custom CSS for Professional UI ---
+CSS_PATH = Path(__file__).parent / "assets" / "style.css"
+
+@st.cache_resource
+def read_css():
+    """Reads the app stylesheet from disk once per server process."""
+    return CSS_PATH.read_text(encoding="utf-8")
+
 def load_css():
     """Loads custom CSS for styling the app."""
-    st.markdown("""
-        <style>
-            /* --- General Styles --- */
-            .main { background-color: #F0F2F6; }
-            h1, h2, h3 { color: #1E2A38; }
-            .st-emotion-cache-18ni7ap, .st-emotion-cache-z5fcl4 { background-color: #F0F2F6; }
-
-            /* --- Sidebar --- */
-            [data-testid="stSidebar"] { background-color: #1E2A38; color: #FFFFFF; }
-            [data-testid="stSidebar"] h2, [data-testid="stSidebar"] h3, [data-testid="stSidebar"] label { color: #FFFFFF; }
-            
-            /* --- Metric & Report Cards --- */
-            .card { background-color: #FFFFFF; border-radius: 10px; padding: 25px; box-shadow: 0 4px 8px rgba(0,0,0,0.05); margin-bottom: 20px; border: 1px solid #EAECEE; height: 100%; }
-            .metric-card { background-color: #FFFFFF; border-left: 5px solid #007BFF; padding: 15px 20px; border-radius: 8px; box-shadow: 0 2px 4px rgba(0,0,0,0.04); }
-            .metric-card.portfolio { border-left-color: #28a745; }
-            .metric-card h5 { margin: 0; font-size: 16px; color: #566573; }
-            .metric-card p { margin: 5px 0 0 0; font-size: 24px; font-weight: 600; color: #1E2A38; }
-            .recommendation-card { background-color: #eaf2f8; border-left: 6px solid #5499c7; padding: 20px; border-radius: 8px; margin-top: 15px; }
-            .recommendation-card h5 { color: #1a5276; margin-top: 0; margin-bottom: 10px; }
-            .recommendation-card p, .recommendation-card li { font-size: 15px; color: #212f3c; }
-            .report-section { margin-bottom: 25px; }
-        </style>
-    """, unsafe_allow_html=True)
+    # Streamlit drops elements that a rerun does not re-emit, so the <style> tag is sent every run.
+    st.markdown(f"<style>{read_css()}</style>", unsafe_allow_html=True)
 
 # --- Data Fetching and Analysis Functions ---
-@st.cache_data(ttl=600)
+# Downloads are also persisted to disk so a server restart within the TTL skips the Yahoo round-trip.
+# The layers stack: a disk file just under the TTL old can be loaded and then held in memory for a
+# full TTL, so prices shown can be up to 2 * MARKET_DATA_TTL (20 minutes) old.
+MARKET_DATA_CACHE_DIR = Path(__file__).parent / ".cache"
+MARKET_DATA_TTL = 600
+
+@st.cache_data(ttl=MARKET_DATA_TTL)
 def get_market_data(tickers):
-    """Fetches historical market data for multiple tickers."""
+    """Fetches historical closing prices for multiple tickers."""
     end_date = datetime.now()
     start_date = end_date - timedelta(days=365)
-    data = yf.download(tickers, start=start_date, end=end_date)
-    return data if not data.empty else None
-
-@st.cache_data(ttl=600)
-def get_stock_info(ticker):
-    """Fetches financial info for a single ticker."""
-    stock = yf.Ticker(ticker)
-    return stock.info
+    tickers_key = hashlib.md5(",".join(tickers).encode("utf-8"), usedforsecurity=False).hexdigest()[:12]
+    # One file per ticker set, overwritten in place; the mtime check alone decides freshness.
+    cache_path = MARKET_DATA_CACHE_DIR / f"prices_{tickers_key}.pkl"
+    if cache_path.exists() and time.time() - cache_path.stat().st_mtime < MARKET_DATA_TTL:
+        try:
+            return pd.read_pickle(cache_path)
+        except Exception:
+            pass  # Unreadable cache file; fall through to a fresh download.
+
+    data = yf.download(tickers, start=start_date, end=end_date, auto_adjust=True, threads=True, progress=False)
+    if data.empty: return None
+    # Only Close is used downstream; caching just that block keeps every cache-hit copy small.
+    close_data = data['Close']
+    try:
+        MARKET_DATA_CACHE_DIR.mkdir(exist_ok=True)
+        close_data.to_pickle(cache_path)
+    except OSError:
+        pass  # A read-only deployment still works, just without the disk cache.
+    return close_data
+
+def rolling_mean(values, window):
+    """Trailing simple moving average of a 1-D array, NaN-padded like pandas' rolling().mean()."""
+    out = np.full(values.shape, np.nan)
+    if len(values) >= window:
+        # O(N) cumulative-sum differencing; any NaN in a window leaves that output NaN.
+        valid = ~np.isnan(values)
+        sums = np.concatenate(([0.0], np.cumsum(np.where(valid, values, 0.0))))
+        counts = np.concatenate(([0], np.cumsum(valid)))
+        full = (counts[window:] - counts[:-window]) == window
+        out[window - 1:] = np.where(full, (sums[window:] - sums[:-window]) / window, np.nan)
+    return out
 
 def calculate_technicals(df):
     """Calculates technical indicators for a given dataframe."""
     if df.empty: return df
-    df['MA50'] = df['Close'].rolling(window=50).mean()
-    df['MA200'] = df['Close'].rolling(window=200).mean()
-    delta = df['Close'].diff()
-    gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-    loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-    rs = gain / loss
-    df['RSI'] = 100 - (100 / (1 + rs))
+    close = df['Close'].to_numpy(dtype=np.float64)
+    df['MA50'] = rolling_mean(close, 50)
+    df['MA200'] = rolling_mean(close, 200)
+    delta = np.diff(close, prepend=np.nan)
+    gain = rolling_mean(np.clip(delta, 0, None), 14)
+    loss = rolling_mean(np.clip(-delta, 0, None), 14)
+    # 100 * gain / (gain + loss) equals 100 - 100 / (1 + gain / loss); flat windows stay NaN.
+    total = gain + loss
+    total[total == 0] = np.nan
+    df['RSI'] = 100.0 * gain / total
     return df
 
+# Keyed on the downloaded frame rather than a TTL, so it never outlives the data it was built from.
+@st.cache_data(max_entries=4)
+def prepare_security_frames(market_data, tickers, technical_tickers):
+    """Cleans each ticker's close series and computes its latest price once per download.
+
+    Technicals are only computed for `technical_tickers`, since only those feed the commentary.
+    """
+    if market_data is None: return None
+    frames = {}
+    for ticker in tickers:
+        df_close = market_data.get(ticker, pd.Series(dtype=float))
+        df = df_close.dropna().to_frame('Close')
+        if ticker in technical_tickers: df = calculate_technicals(df)
+        has_technicals = 'RSI' in df.columns and df['RSI'].notna().any()
+        # Read the whole last row once rather than indexing each column separately.
+        latest = df.iloc[-1] if not df.empty else None
+        frames[ticker] = {
+            'df': df,
+            'latest_price': float(latest['Close']) if latest is not None else 0,
+            # Latest indicator values for the commentary; None when there is too little history.
+            'last': {'rsi': float(latest['RSI']), 'ma50': float(latest['MA50']), 'ma200': float(latest['MA200'])} if has_technicals else None
+        }
+    return frames
+
 def calculate_portfolio_beta(portfolio_securities, index_df):
     """Calculates the portfolio's beta with respect to a given index."""
     portfolio_value = pd.Series(0, index=index_df.index)
@@ -73,16 +118,14 @@ def calculate_portfolio_beta(portfolio_securities, index_df):
         asset_value = data['df']['Close'] * data['shares']
         portfolio_value = portfolio_value.add(asset_value, fill_value=0)
     
-    portfolio_value = portfolio_value.ffill().dropna()
-    aligned_index_df = index_df.reindex(portfolio_value.index).ffill().dropna()
-    portfolio_value = portfolio_value.reindex(aligned_index_df.index).ffill().dropna()
-
-    if portfolio_value.empty or aligned_index_df.empty: return 0
-
-    portfolio_returns = portfolio_value.pct_change().dropna()
-    index_returns = aligned_index_df['Close'].pct_change().dropna()
-    
-    returns_df = pd.DataFrame({'portfolio': portfolio_returns, 'index': index_returns}).dropna()
+    # Beta is measured only over sessions where the index's 200-day MA is defined, i.e. after its
+    # first 199 closes; rows before that start have no index value and drop out below.
+    index_close = index_df['Close'].iloc[199:]
+    # Align both series in one frame so a single ffill/dropna pass covers them.
+    aligned_df = pd.DataFrame({'portfolio': portfolio_value, 'index': index_close}).ffill().dropna()
+    if aligned_df.empty: return 0
+
+    returns_df = aligned_df.pct_change().dropna()
     
     if len(returns_df) < 2: return 0
 
@@ -92,12 +135,62 @@ def calculate_portfolio_beta(portfolio_securities, index_df):
     beta = covariance / variance if variance != 0 else 0
     return beta
 
+# Plotted price range around the spot price, as (low, high) multipliers.
+DIRECT_PAYOFF_BOUNDS = (0.8, 1.2)
+CROSS_PAYOFF_BOUNDS = (0.85, 1.15)
+
+def payoff_breakpoints(spot, strike, bounds):
+    """Returns the low bound, the strike clamped into range and the high bound of a payoff chart."""
+    # A put payoff is piecewise linear with one kink at the strike, so these three points draw it exactly.
+    low, high = spot * bounds[0], spot * bounds[1]
+    return np.array([low, min(max(strike, low), high), high])
+
+def put_payoff(price_range, strike, premium):
+    """Per-unit long put P&L at expiry; broadcasts over arrays of strikes or premiums for sweeps."""
+    return np.maximum(strike - price_range, 0) - premium
+
+def compute_direct_payoff(price, shares, strike, premium):
+    """Computes protective-put P&L curves for a single stock, plus the breakeven and max loss."""
+    price_range = payoff_breakpoints(price, strike, DIRECT_PAYOFF_BOUNDS)
+    stock_pnl = (price_range - price) * shares
+    hedged_pnl = put_payoff(price_range, strike, premium)
+    hedged_pnl *= shares
+    hedged_pnl += stock_pnl
+    breakeven = price + premium
+    max_loss = (price - strike + premium) * shares if price > strike else premium * shares
+    return price_range, stock_pnl, hedged_pnl, float(breakeven), float(max_loss)
+
+def compute_cross_payoff(index_price, portfolio_value, beta, hedge_units, strike, premium):
+    """Computes index-put hedged P&L curves for the portfolio, plus the breakeven and max loss."""
+    index_price_range = payoff_breakpoints(index_price, strike, CROSS_PAYOFF_BOUNDS)
+    portfolio_change = (index_price_range / index_price - 1) * portfolio_value * beta
+    hedged_pnl = put_payoff(index_price_range, strike, premium)
+    hedged_pnl *= hedge_units
+    hedged_pnl += portfolio_change
+    breakeven = index_price + (premium / beta) if beta != 0 else float('inf')
+    max_loss = (premium * hedge_units) - ((index_price - strike) * hedge_units * beta)
+    return index_price_range, portfolio_change, hedged_pnl, float(breakeven), float(max_loss)
+
 # --- Analyst Commentary & Report Generation ---
-def generate_analyst_commentary(security_data):
+# (overall sentiment, final take, strategy template) for each outlook.
+OUTLOOK_STRONGLY_BULLISH = ("Strongly Bullish", "Outlook is clearly bullish.", "**Primary Strategy:** Consider buying the underlying stock or **Call Options on {name}** to participate in the upward trend.\n\n**Hedging:** A protective put can be used as low-cost insurance against unexpected shocks.")
+OUTLOOK_STRONGLY_BEARISH = ("Strongly Bearish", "Outlook is decidedly bearish.", "**Hedge Instrument:** Buy **Put Options on {name}**. This is a prime scenario to protect your holdings against a potential drop in price.")
+OUTLOOK_MIXED = ("Mixed", "Conflicting signals suggest uncertainty.", "**Hedge Instrument:** Consider buying **Put Options on {name}**. This will act as valuable insurance against downside volatility in an uncertain market.")
+OUTLOOK_NEUTRAL = ("Neutral", "Indecisive; consolidation phase.", "**Hedge Instrument:** A **Protective Put on {name}** can be used to define your maximum risk while waiting for a clearer market direction.")
+
+# Decision matrix keyed by (RSI sentiment, trend sentiment).
+COMMENTARY_OUTCOMES = {
+    ("Bullish", "Bullish"): OUTLOOK_STRONGLY_BULLISH,
+    ("Bearish", "Bearish"): OUTLOOK_STRONGLY_BEARISH,
+    ("Bullish", "Bearish"): OUTLOOK_MIXED,
+    ("Bearish", "Bullish"): OUTLOOK_MIXED,
+    ("Neutral", "Bullish"): OUTLOOK_NEUTRAL,
+    ("Neutral", "Bearish"): OUTLOOK_NEUTRAL,
+}
+
+def generate_analyst_commentary(name, latest_rsi, ma50, ma200):
     """Generates a dynamic analysis for a single security with specific recommendations."""
-    name = security_data['name']
-    df = security_data['df']
-    if df.empty or 'RSI' not in df.columns or df['RSI'].isnull().all():
+    if latest_rsi is None:
         return {
             "trend_view": "Not enough data for trend analysis.",
             "rsi_view": "Not enough data for momentum analysis.",
@@ -105,29 +198,27 @@ def generate_analyst_commentary(security_data):
             "overall_sentiment": "Unknown"
         }
 
-    latest_rsi = df['RSI'].iloc[-1]; ma50 = df['MA50'].iloc[-1]; ma200 = df['MA200'].iloc[-1]
     if latest_rsi > 70: rsi_view, rsi_sentiment = f"RSI is **{latest_rsi:.2f}** (overbought), suggesting a potential pullback.", "Bearish"
     elif latest_rsi < 30: rsi_view, rsi_sentiment = f"RSI is **{latest_rsi:.2f}** (oversold), suggesting a potential bounce.", "Bullish"
     else: rsi_view, rsi_sentiment = f"RSI is **{latest_rsi:.2f}** (neutral), implying balanced momentum.", "Neutral"
     if ma50 > ma200: trend_view, trend_sentiment = f"A **'Golden Cross'** is in effect (50-day MA > 200-day MA), a classic bullish signal.", "Bullish"
     else: trend_view, trend_sentiment = f"A **'Death Cross'** has occurred (50-day MA < 200-day MA), a bearish signal.", "Bearish"
-    sentiments = [rsi_sentiment, trend_sentiment]
-
-    if sentiments.count("Bullish")==2:
-        sentiment, final_take = "Strongly Bullish", "Outlook is clearly bullish."
-        strategy = f"**Primary Strategy:** Consider buying the underlying stock or **Call Options on {name}** to participate in the upward trend.\n\n**Hedging:** A protective put can be used as low-cost insurance against unexpected shocks."
-    elif sentiments.count("Bearish")==2:
-        sentiment, final_take = "Strongly Bearish", "Outlook is decidedly bearish."
-        strategy = f"**Hedge Instrument:** Buy **Put Options on {name}**. This is a prime scenario to protect your holdings against a potential drop in price."
-    elif "Bearish" in sentiments and "Bullish" in sentiments:
-        sentiment, final_take = "Mixed", "Conflicting signals suggest uncertainty."
-        strategy = f"**Hedge Instrument:** Consider buying **Put Options on {name}**. This will act as valuable insurance against downside volatility in an uncertain market."
-    else: # Neutral
-        sentiment, final_take = "Neutral", "Indecisive; consolidation phase."
-        strategy = f"**Hedge Instrument:** A **Protective Put on {name}** can be used to define your maximum risk while waiting for a clearer market direction."
+    sentiment, final_take, strategy_template = COMMENTARY_OUTCOMES[(rsi_sentiment, trend_sentiment)]
+    strategy = strategy_template.format(name=name)
 
     return {"trend_view": trend_view, "rsi_view": rsi_view, "final_take": final_take, "strategy": strategy, "overall_sentiment": sentiment}
 
+# The recommendation card has no per-run values, so it is defined once at import.
+RECOMMENDATION_HTML = """
+<div class="recommendation-card">
+    <h5>Analyst's Take</h5>
+    <p><b>For a Bearish or Mixed Outlook:</b> A <b>2-Month contract</b> is generally more prudent. It provides a longer window of protection against a potential sustained downtrend or volatility, justifying the higher premium.</p>
+    <p><b>For a Bullish Outlook:</b> A <b>1-Month contract</b> may be sufficient. It acts as a cheaper "catastrophe insurance" against an unexpected, sharp, but short-lived correction, without sacrificing too much upside to high premium costs.</p>
+    <hr>
+    <p><b>Conclusion:</b> Your choice should align with your market view. If you anticipate prolonged weakness, choose the longer duration. If you are generally optimistic but want to guard against a sudden shock, the shorter, cheaper option is more logical.</p>
+</div>
+"""
+
 def generate_strategy_report(portfolio_value, beta, hedge_params):
     """Renders a full report for the cross-hedging strategy using Streamlit components."""
     st.header("📝 Hedging Strategy Report")
@@ -159,22 +250,20 @@ def generate_strategy_report(portfolio_value, beta, hedge_params):
     st.markdown("---")
     st.subheader("3. Final Recommendation")
     with st.container():
-        st.markdown("""
-        <div class="recommendation-card">
-            <h5>Analyst's Take</h5>
-            <p><b>For a Bearish or Mixed Outlook:</b> A <b>2-Month contract</b> is generally more prudent. It provides a longer window of protection against a potential sustained downtrend or volatility, justifying the higher premium.</p>
-            <p><b>For a Bullish Outlook:</b> A <b>1-Month contract</b> may be sufficient. It acts as a cheaper "catastrophe insurance" against an unexpected, sharp, but short-lived correction, without sacrificing too much upside to high premium costs.</p>
-            <hr>
-            <p><b>Conclusion:</b> Your choice should align with your market view. If you anticipate prolonged weakness, choose the longer duration. If you are generally optimistic but want to guard against a sudden shock, the shorter, cheaper option is more logical.</p>
-        </div>
-        """, unsafe_allow_html=True)
+        st.markdown(RECOMMENDATION_HTML, unsafe_allow_html=True)
 
 # --- UI Rendering Functions ---
+# Static chart styling, built once at import and shared by every payoff chart.
+UNHEDGED_LINE = dict(color='#E74C3C', dash='dash', width=2)
+HEDGED_LINE = dict(color='#2ECC71', width=3)
+PAYOFF_LAYOUT = dict(yaxis_title="Profit / Loss (₹)", legend=dict(yanchor="top", y=0.98, xanchor="left", x=0.01))
+
 def render_payoff_chart(price_range, pnl, hedged_pnl, title, xaxis_title, legend_pnl, legend_hedged, breakeven_point=None, max_loss=None):
     """A more generic payoff chart renderer with annotations."""
-    fig = go.Figure()
-    fig.add_trace(go.Scatter(x=price_range, y=pnl, mode='lines', name=legend_pnl, line=dict(color='#E74C3C', dash='dash', width=2)))
-    fig.add_trace(go.Scatter(x=price_range, y=hedged_pnl, mode='lines', name=legend_hedged, line=dict(color='#2ECC71', width=3)))
+    fig = go.Figure(data=[
+        go.Scattergl(x=price_range, y=pnl, mode='lines', name=legend_pnl, line=UNHEDGED_LINE),
+        go.Scattergl(x=price_range, y=hedged_pnl, mode='lines', name=legend_hedged, line=HEDGED_LINE)
+    ], layout=PAYOFF_LAYOUT)
     fig.add_hline(y=0, line_width=1, line_color="black")
     
     # Add annotations for breakeven and max loss
@@ -186,8 +275,22 @@ def render_payoff_chart(price_range, pnl, hedged_pnl, title, xaxis_title, legend
         fig.add_hline(y=-max_loss, line_width=1.5, line_dash="dot", line_color="#E74C3C",
                       annotation_text=f"Max Loss: {-max_loss:,.2f}", annotation_position="bottom right")
 
-    fig.update_layout(title=f"<b>{title}</b>", xaxis_title=xaxis_title, yaxis_title="Profit / Loss (₹)", legend=dict(yanchor="top", y=0.98, xanchor="left", x=0.01))
-    st.plotly_chart(fig, use_container_width=True)
+    # A per-chart uirevision and element key keep each chart's zoom/pan when a rerun redraws it.
+    fig.update_layout(title=f"<b>{title}</b>", xaxis_title=xaxis_title, uirevision=title)
+    st.plotly_chart(fig, use_container_width=True, key=f"payoff_{title}")
+
+@st.fragment
+def render_direct_hedge(name, latest_price, shares, default_strike, default_premium):
+    """Renders one stock's hedge inputs and payoff chart; submitting the form reruns only this fragment."""
+    # Batch the hedge inputs in a form so editing them reruns once, on submit.
+    with st.form(f"direct_hedge_{name}"):
+        direct_k = st.number_input("Strike Price", value=default_strike, step=10.0, key=f"direct_k_{name}")
+        direct_p = st.number_input("Premium", value=default_premium, format="%.2f", key=f"direct_p_{name}")
+        st.form_submit_button("Update Hedge")
+
+    price_range, stock_pnl, hedged_pnl, breakeven_direct, max_loss_direct = compute_direct_payoff(latest_price, shares, direct_k, direct_p)
+
+    render_payoff_chart(price_range, stock_pnl, hedged_pnl, f"Direct Hedge on {name}", f"{name} Price at Expiry", "Unhdged P&L", "Hedged P&L", breakeven_point=breakeven_direct, max_loss=max_loss_direct)
 
 # --- Main App ---
 load_css()
@@ -200,31 +303,32 @@ with st.sidebar:
         st.write("**Cross Hedge:** Using a related instrument (e.g., Nifty Auto puts) to hedge an asset or portfolio. Success depends on the correlation (Beta).")
     st.markdown("---")
     st.markdown("### **Portfolio Definition**")
-    TICKER_MAP = {"Reliance": "RELIANCE.NS", "Infosys": "INFY.NS", "HDFC Bank": "HDFCBANK.NS", "Nifty Auto Index": "^CNXAUTO"}
+    STOCK_TICKER_MAP = {"Reliance": "RELIANCE.NS", "Infosys": "INFY.NS", "HDFC Bank": "HDFCBANK.NS"}
+    TICKER_MAP = {**STOCK_TICKER_MAP, "Nifty Auto Index": "^CNXAUTO"}
     shares_input = {name: st.number_input(f"Shares of {name}" if 'Index' not in name else f"Units of {name}", min_value=0, value=50, key=f"{name}_sh") for name in TICKER_MAP.keys()}
 
 # --- Main Page ---
 st.title("Live Comprehensive Hedging Dashboard")
 st.markdown("An advanced tool for direct and cross-hedging analysis, complete with automated reporting.")
 
-market_data = get_market_data(list(TICKER_MAP.values()))
+security_frames = prepare_security_frames(get_market_data(list(TICKER_MAP.values())), tuple(TICKER_MAP.values()), tuple(STOCK_TICKER_MAP.values()))
 
-if market_data is not None:
+if security_frames is not None:
     try:
         # --- Data Processing ---
         securities = {}
         for name, ticker in TICKER_MAP.items():
-            df_close = market_data['Close'][ticker] if isinstance(market_data.columns, pd.MultiIndex) else market_data.get(ticker, pd.Series(dtype=float))
-            df = df_close.dropna().to_frame('Close')
+            frame = security_frames[ticker]
             securities[name] = {
-                'name': name, 'ticker': ticker, 'df': calculate_technicals(df.copy()),
-                'latest_price': df['Close'].iloc[-1] if not df.empty else 0,
-                'shares': shares_input[name],
-                'info': get_stock_info(ticker) if 'Index' not in name else {}
+                'name': name, 'ticker': ticker, 'df': frame['df'],
+                'latest_price': frame['latest_price'], 'last': frame['last'],
+                'shares': shares_input[name]
             }
         
-        stock_securities = {k: v for k, v in securities.items() if 'Index' not in k}
-        portfolio_value = sum(data['latest_price'] * data['shares'] for data in stock_securities.values())
+        stock_securities = {name: securities[name] for name in STOCK_TICKER_MAP}
+        stock_prices = np.fromiter((data['latest_price'] for data in stock_securities.values()), dtype=np.float64, count=len(stock_securities))
+        stock_shares = np.fromiter((data['shares'] for data in stock_securities.values()), dtype=np.int64, count=len(stock_securities))
+        portfolio_value = float(stock_prices @ stock_shares)
         nifty_auto_data = securities["Nifty Auto Index"]
 
         # --- Main Tabs ---
@@ -232,40 +336,31 @@ if market_data is not None:
 
         with tab_dashboard:
             st.subheader("Live Portfolio Snapshot")
-            cols = st.columns(len(securities) + 1)
-            for i, (name, data) in enumerate(securities.items()):
-                with cols[i]:
-                    st.markdown(f"<div class='metric-card'><h5>{name}</h5><p>₹{data['latest_price']:,.2f}</p></div>", unsafe_allow_html=True)
-            with cols[len(securities)]:
-                st.markdown(f"<div class='metric-card portfolio'><h5>Stock Portfolio Value</h5><p>₹{portfolio_value:,.2f}</p></div>", unsafe_allow_html=True)
+            # Emit the whole card row as one element instead of one column and markdown call per card.
+            cards_html = "".join(f"<div class='metric-card'><h5>{name}</h5><p>₹{data['latest_price']:,.2f}</p></div>" for name, data in securities.items())
+            cards_html += f"<div class='metric-card portfolio'><h5>Stock Portfolio Value</h5><p>₹{portfolio_value:,.2f}</p></div>"
+            st.markdown(f"<div class='metric-row'>{cards_html}</div>", unsafe_allow_html=True)
             st.info("This dashboard shows the current value of your holdings. Use the other tabs to analyze hedging strategies.")
 
         with tab_direct:
             st.header("Single-Stock Direct Hedging Analysis")
             st.write("This section analyzes hedging each stock individually with its own put option.")
             
-            for name, data in stock_securities.items():
+            # Default strikes (2% OTM, rounded to 10) and premiums (2% of price) for every stock in one pass.
+            default_strikes = np.round(stock_prices * 0.98, -1)
+            default_premiums = stock_prices * 0.02
+
+            for i, (name, data) in enumerate(stock_securities.items()):
                 st.markdown("---")
                 st.subheader(f"Analysis for: {name}")
                 
-                analysis = generate_analyst_commentary(data)
+                last = data['last'] or {}
+                analysis = generate_analyst_commentary(name, last.get('rsi'), last.get('ma50'), last.get('ma200'))
                 st.info(f"**Analyst View:** The current outlook for {name} is **{analysis['overall_sentiment']}**. {analysis['final_take']}")
 
                 col1, col2 = st.columns([3, 1])
                 with col1:
-                    direct_k = st.number_input("Strike Price", value=float(round(data['latest_price'] * 0.98, -1)), step=10.0, key=f"direct_k_{name}")
-                    direct_p = st.number_input("Premium", value=data['latest_price'] * 0.02, format="%.2f", key=f"direct_p_{name}")
-
-                    price_range = np.linspace(data['latest_price'] * 0.8, data['latest_price'] * 1.2, 100)
-                    stock_pnl = (price_range - data['latest_price']) * data['shares']
-                    put_pnl = (np.maximum(direct_k - price_range, 0) - direct_p) * data['shares']
-                    hedged_pnl = stock_pnl + put_pnl
-
-                    # Calculate breakeven and max loss for direct hedge
-                    breakeven_direct = data['latest_price'] + direct_p
-                    max_loss_direct = (data['latest_price'] - direct_k + direct_p) * data['shares'] if data['latest_price'] > direct_k else direct_p * data['shares']
-
-                    render_payoff_chart(price_range, stock_pnl, hedged_pnl, f"Direct Hedge on {name}", f"{name} Price at Expiry", "Unhdged P&L", "Hedged P&L", breakeven_point=breakeven_direct, max_loss=max_loss_direct)
+                    render_direct_hedge(name, data['latest_price'], data['shares'], float(default_strikes[i]), float(default_premiums[i]))
                 
                 with col2:
                     st.markdown("**Strategy Recommendation**")
@@ -285,35 +380,28 @@ if market_data is not None:
             st.markdown("---")
             st.markdown("#### Hedging Contract Comparison")
             
+            with st.form("cross_hedge_params"):
+                col1, col2 = st.columns(2)
+                with col1:
+                    st.markdown("##### 1-Month Contract")
+                    k1 = st.number_input("Strike Price (1-Mo)", value=float(round(nifty_auto_data['latest_price'] * 0.98, -2)), step=50.0, key="k1")
+                    p1 = st.number_input("Premium (1-Mo)", value=nifty_auto_data['latest_price'] * 0.015, format="%.2f", key="p1")
+                with col2:
+                    st.markdown("##### 2-Month Contract")
+                    k2 = st.number_input("Strike Price (2-Mo)", value=float(round(nifty_auto_data['latest_price'] * 0.98, -2)), step=50.0, key="k2")
+                    p2 = st.number_input("Premium (2-Mo)", value=nifty_auto_data['latest_price'] * 0.025, format="%.2f", key="p2")
+                st.form_submit_button("Update Hedges")
+
             col1, col2 = st.columns(2)
             with col1:
-                st.markdown("##### 1-Month Contract")
-                k1 = st.number_input("Strike Price (1-Mo)", value=float(round(nifty_auto_data['latest_price'] * 0.98, -2)), step=50.0, key="k1")
-                p1 = st.number_input("Premium (1-Mo)", value=nifty_auto_data['latest_price'] * 0.015, format="%.2f", key="p1")
-                
-                index_price_range = np.linspace(nifty_auto_data['latest_price'] * 0.85, nifty_auto_data['latest_price'] * 1.15, 100)
-                portfolio_change = (index_price_range / nifty_auto_data['latest_price'] - 1) * portfolio_value * beta
-                put_pnl1 = (np.maximum(k1 - index_price_range, 0) - p1) * hedge_units
-                hedged_pnl1 = portfolio_change + put_pnl1
-                
-                breakeven_cross_1 = nifty_auto_data['latest_price'] + (p1 / beta) if beta !=0 else float('inf')
-                max_loss_cross_1 = (p1 * hedge_units) - ((nifty_auto_data['latest_price'] - k1) * hedge_units * beta)
+                index_price_range, portfolio_change, hedged_pnl1, breakeven_cross_1, max_loss_cross_1 = compute_cross_payoff(nifty_auto_data['latest_price'], portfolio_value, beta, hedge_units, k1, p1)
 
                 render_payoff_chart(index_price_range, portfolio_change, hedged_pnl1, "1-Month Hedge Payoff", "Nifty Auto Price at Expiry", "Unhedged Portfolio P&L", "Hedged P&L (1-Mo)", breakeven_point=breakeven_cross_1, max_loss=max_loss_cross_1)
 
             with col2:
-                st.markdown("##### 2-Month Contract")
-                k2 = st.number_input("Strike Price (2-Mo)", value=float(round(nifty_auto_data['latest_price'] * 0.98, -2)), step=50.0, key="k2")
-                p2 = st.number_input("Premium (2-Mo)", value=nifty_auto_data['latest_price'] * 0.025, format="%.2f", key="p2")
-                
-                portfolio_change_2 = (index_price_range / nifty_auto_data['latest_price'] - 1) * portfolio_value * beta
-                put_pnl2 = (np.maximum(k2 - index_price_range, 0) - p2) * hedge_units
-                hedged_pnl2 = portfolio_change_2 + put_pnl2
-
-                breakeven_cross_2 = nifty_auto_data['latest_price'] + (p2 / beta) if beta !=0 else float('inf')
-                max_loss_cross_2 = (p2 * hedge_units) - ((nifty_auto_data['latest_price'] - k2) * hedge_units * beta)
+                index_price_range_2, portfolio_change_2, hedged_pnl2, breakeven_cross_2, max_loss_cross_2 = compute_cross_payoff(nifty_auto_data['latest_price'], portfolio_value, beta, hedge_units, k2, p2)
 
-                render_payoff_chart(index_price_range, portfolio_change_2, hedged_pnl2, "2-Month Hedge Payoff", "Nifty Auto Price at Expiry", "Unhedged Portfolio P&L", "Hedged P&L (2-Mo)", breakeven_point=breakeven_cross_2, max_loss=max_loss_cross_2)
+                render_payoff_chart(index_price_range_2, portfolio_change_2, hedged_pnl2, "2-Month Hedge Payoff", "Nifty Auto Price at Expiry", "Unhedged Portfolio P&L", "Hedged P&L (2-Mo)", breakeven_point=breakeven_cross_2, max_loss=max_loss_cross_2)
 
         with tab_report:
             if 'k1' in st.session_state and 'p1' in st.session_state and 'k2' in st.session_state and 'p2' in st.session_state: